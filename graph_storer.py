@@ -2,45 +2,45 @@
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")  # Non-interactive, files are only ever saved
+import matplotlib.pyplot as plt  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+ANNOT_MAX_CELLS = 400  # Larger grids skip per-cell text annotations
 
 
 def save_heatmap(
     df: pd.DataFrame,
-    index: str,
-    column: str,
-    values: str,
     file_parts: tuple[str, str],
 ) -> None:
     """
-    Process a dataframe into a heatmap that is saved to file
+    Process a pivoted dataframe into a heatmap that is saved to file.
+    Saved at 150 dpi, half the contour plot's 300, to cut PNG encode time
 
     Parameters
     ----------
     df: pd.DataFrame
-        Contains dataframe to be plotted
-    index: str
-        dataframe column to represent index
-    column: str
-        dataframe column to represent column
-    values: str
-        dataframe column to represent values
+        Pivoted dataframe to be plotted, with cost_constraint_ratio as
+        index and chain_strength as columns
     file_parts: tuple[str,str]
         prefix and suffix for '_heatmap_'
     """
-    df = df.pivot(index=index, columns=column, values=values)
+    cells = df.shape[0] * df.shape[1]
 
     fig = plt.figure(figsize=(8, 6))
-    ax = sns.heatmap(df, annot=True, cmap="coolwarm_r")
+    ax = sns.heatmap(
+        df, annot=cells <= ANNOT_MAX_CELLS, fmt=".2g", cmap="coolwarm_r"
+    )
     ax.invert_yaxis()
     plt.title("Heatmap")
     plt.xlabel("chain_strength")
     plt.ylabel("cost_constraint_ratio")
     plt.savefig(
         os.path.join("data", file_parts[0] + "_heatmap_" + file_parts[1]),
-        dpi=300,
+        dpi=150,
         bbox_inches="tight",
     )
     plt.close(fig)
@@ -48,29 +48,19 @@ def save_heatmap(
 
 def save_contour_plot(
     df: pd.DataFrame,
-    index: str,
-    column: str,
-    values: str,
     file_parts: tuple[str, str],
 ) -> None:
     """
-    Process a dataframe into a contour plot that is saved to file
+    Process a pivoted dataframe into a contour plot that is saved to file
 
     Parameters
     ----------
     df: pd.DataFrame
-        Contains dataframe to be plotted
-    index: str
-        dataframe column to represent index
-    column: str
-        dataframe column to represent column
-    values: str
-        dataframe column to represent values
+        Pivoted dataframe to be plotted, with cost_constraint_ratio as
+        index and chain_strength as columns
     file_parts: tuple[str,str]
         prefix and suffix for '_heatmap_'
     """
-    df = df.pivot(index=index, columns=column, values=values)
-
     x = df.columns.values
     y = df.index.values
     x, y = np.meshgrid(x, y)
@@ -2,14 +2,32 @@
 
 import sys
 import os
-import ast
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 import graph_storer as gs
 import route_storer as rs
+from pydantic_models import RouteInput
 
 # cd to post_processing
 # python post_processing.py "output" "test1" "Locations.json"
 
+ROUTES_PER_BATCH = 16  # Routes rendered per worker task
+
+# Columns read from the CSV, route is parsed separately by json.loads
+CSV_COLUMNS = [
+    "cost_constraint_ratio",
+    "chain_strength",
+    "trial",
+    "relative_cost",
+    "route",
+]
+# Only declare dtypes that cannot change how values print in file names
+# and plots, sweep parameters and costs are left to inference
+CSV_DTYPES = {"trial": "int32"}
+
 
 def post_process() -> None:
     """
@@ -31,13 +49,23 @@ def post_process() -> None:
     output_file = sys.argv[2]
     orders_file = sys.argv[3]
 
-    df = pd.read_csv(os.path.join("data", input_name + ".csv"))
-    success_df = df[df["relative_cost"] != -1]
+    # Validate the payload up front, before any plotting work
+    locations = rs.load_locations(orders_file)
+
+    df = pd.read_csv(
+        os.path.join("data", input_name + ".csv"),
+        usecols=CSV_COLUMNS,
+        dtype=CSV_DTYPES,
+        converters={"route": json.loads},
+    )
+    failed_mask = df["relative_cost"].to_numpy() == -1
+    success_df = df[~failed_mask]
+    failed_df = df[failed_mask]
 
     average(success_df, output_file)
     best(success_df, output_file)
-    failed_occurences(df, output_file)
-    visualise_deliveries(df, orders_file)
+    failed_occurences(failed_df, output_file)
+    visualise_deliveries(df, locations)
 
 
 def average(success_df: pd.DataFrame, output_file: str) -> None:
@@ -51,25 +79,15 @@ def average(success_df: pd.DataFrame, output_file: str) -> None:
     output_file: str
         File name for output files
     """
-    average_df = (
-        success_df.groupby(["cost_constraint_ratio", "chain_strength"])
-        .agg({"relative_cost": "mean"})
-        .reset_index()
-    )
-    gs.save_heatmap(
-        average_df,
-        "cost_constraint_ratio",
-        "chain_strength",
-        "relative_cost",
-        ("avg", output_file),
-    )
-    gs.save_contour_plot(
-        average_df,
-        "cost_constraint_ratio",
-        "chain_strength",
-        "relative_cost",
-        ("avg", output_file),
+    average_df = success_df.pivot_table(
+        index="cost_constraint_ratio",
+        columns="chain_strength",
+        values="relative_cost",
+        aggfunc="mean",
+        observed=True,
     )
+    gs.save_heatmap(average_df, ("avg", output_file))
+    gs.save_contour_plot(average_df, ("avg", output_file))
 
 
 def best(success_df: pd.DataFrame, output_file: str) -> None:
@@ -83,78 +101,106 @@ def best(success_df: pd.DataFrame, output_file: str) -> None:
     output_file: str
         File name for output files
     """
-    idx = success_df.groupby(["cost_constraint_ratio", "chain_strength"])[
-        "relative_cost"
-    ].idxmin()
-    min_relative_cost_df = success_df.loc[idx].reset_index(drop=True)
-
-    gs.save_heatmap(
-        min_relative_cost_df,
-        "cost_constraint_ratio",
-        "chain_strength",
-        "relative_cost",
-        ("best", output_file),
+    # Stable sort keeps the first of any tied minimum, matching idxmin
+    min_relative_cost_df = (
+        success_df.sort_values("relative_cost", kind="stable")
+        .drop_duplicates(subset=["cost_constraint_ratio", "chain_strength"])
+        .reset_index(drop=True)
     )
-    gs.save_contour_plot(
-        min_relative_cost_df,
-        "cost_constraint_ratio",
-        "chain_strength",
-        "relative_cost",
-        ("best", output_file),
+
+    min_relative_cost_df = min_relative_cost_df.pivot(
+        index="cost_constraint_ratio",
+        columns="chain_strength",
+        values="relative_cost",
     )
+    gs.save_heatmap(min_relative_cost_df, ("best", output_file))
+    gs.save_contour_plot(min_relative_cost_df, ("best", output_file))
 
 
-def failed_occurences(df: pd.DataFrame, output_file: str) -> None:
+def failed_occurences(failed_df: pd.DataFrame, output_file: str) -> None:
     """
     Save a heatmap of failed number of occurences
 
     Parameters
     ----------
-    df: DataFrame
-        Contains raw data from CSV
+    failed_df: DataFrame
+        Contains failed trials
     output_file: str
         File name for output files
     """
-    failed_routes_df = df[df["relative_cost"] == -1]
-    if not failed_routes_df.empty:
+    if not failed_df.empty:
         failed_routes_df = (
-            failed_routes_df.groupby(
-                ["cost_constraint_ratio", "chain_strength"]
+            failed_df.groupby(
+                ["cost_constraint_ratio", "chain_strength"],
+                observed=True,
+                sort=False,
             )
             .size()
             .reset_index(name="failed_routes_count")
+            .pivot(
+                index="cost_constraint_ratio",
+                columns="chain_strength",
+                values="failed_routes_count",
+            )
         )
-        gs.save_heatmap(
-            failed_routes_df,
-            "cost_constraint_ratio",
-            "chain_strength",
-            "failed_routes_count",
-            ("fails", output_file),
-        )
+        gs.save_heatmap(failed_routes_df, ("fails", output_file))
 
 
-def visualise_deliveries(df: pd.DataFrame, orders_file: str) -> None:
+def visualise_deliveries(df: pd.DataFrame, locations: RouteInput) -> None:
     """
     For every found route, graph the route associated.
+    Routes are rendered in batches in parallel across worker processes.
+    Repeated routes are rendered once and copied to their other file names.
     Outputs files to data/routes
 
     Parameters
     ----------
     df: DataFrame
-        Contains raw data from CSV
-    orders_file: str
-        JSON file name containing payload
+        Contains raw data from CSV, with routes parsed into lists
+    locations: RouteInput
+        Validated payload of orders
     """
-    for _, row in df.iterrows():
-        cost_constraint_ratio = str(row["cost_constraint_ratio"])
-        chain_strength = str(row["chain_strength"])
-        trial = str(row["trial"])
-        relative_cost = str(row["relative_cost"])
-        filename = (
-            f"{cost_constraint_ratio}_{chain_strength}_{trial}_{relative_cost}"
+    rows = df[CSV_COLUMNS].itertuples(index=False, name=None)
+    # Rows sharing a file name overwrote each other, so the last row wins
+    file_routes = {}
+    for ratio, strength, trial, relative_cost, route in rows:
+        file_routes[f"{ratio}_{strength}_{trial}_{relative_cost}"] = route
+
+    routes = []
+    filenames = []
+    rendered = {}  # Route as tuple -> file name it is rendered to
+    duplicates = []  # (rendered file name, copy file name)
+    for filename, route in file_routes.items():
+        key = tuple(route)
+        if key in rendered:
+            duplicates.append((rendered[key], filename))
+        else:
+            rendered[key] = filename
+            routes.append(route)
+            filenames.append(filename)
+
+    lats, longs, order_positions = rs.reformat_locations(locations)
+
+    # Each batch reuses a single figure within its worker
+    batches = range(0, len(routes), ROUTES_PER_BATCH)
+    with ProcessPoolExecutor() as executor:
+        # Consume the results so worker exceptions are raised here
+        list(
+            executor.map(
+                rs.render_routes,
+                repeat(lats),
+                repeat(longs),
+                repeat(order_positions),
+                (routes[i : i + ROUTES_PER_BATCH] for i in batches),
+                (filenames[i : i + ROUTES_PER_BATCH] for i in batches),
+                repeat("routes"),
+            )
+        )
+
+    for source, copy in duplicates:
+        shutil.copyfile(
+            rs.route_path("routes", source), rs.route_path("routes", copy)
         )
-        route_list = ast.literal_eval(row["route"])
-        rs.create_graph(orders_file, route_list, "routes", filename)
 
 
 if __name__ == "__main__":
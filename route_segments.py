@@ -0,0 +1,73 @@
+"""Builds the line segments for a route from projected order coordinates"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, fall back to NumPy
+    njit = None
+
+
+def __build_segments_loop(
+    positions: np.ndarray, lats: np.ndarray, longs: np.ndarray, shrink: float
+) -> np.ndarray:
+    """
+    Single pass over the route, compiled by Numba when it is available
+    """
+    count = max(len(positions) - 1, 0)
+    segments = np.empty((count, 2, 2))
+    for i in range(count):
+        start = positions[i]
+        end = positions[i + 1]
+        d_lon = longs[end] - longs[start]
+        d_lat = lats[end] - lats[start]
+        segments[i, 0, 0] = longs[start] + shrink * d_lon
+        segments[i, 0, 1] = lats[start] + shrink * d_lat
+        segments[i, 1, 0] = longs[end] - shrink * d_lon
+        segments[i, 1, 1] = lats[end] - shrink * d_lat
+    return segments
+
+
+def __build_segments_numpy(
+    positions: np.ndarray, lats: np.ndarray, longs: np.ndarray, shrink: float
+) -> np.ndarray:
+    """
+    Vectorised equivalent of __build_segments_loop, used without Numba
+    """
+    starts = np.column_stack([longs[positions[:-1]], lats[positions[:-1]]])
+    ends = np.column_stack([longs[positions[1:]], lats[positions[1:]]])
+    directions = ends - starts
+    return np.stack(
+        [starts + shrink * directions, ends - shrink * directions], axis=1
+    )
+
+
+if njit is not None:
+    __build_segments = njit(cache=True, fastmath=True)(__build_segments_loop)
+else:
+    __build_segments = __build_segments_numpy
+
+
+def build_segments(
+    positions: np.ndarray, lats: np.ndarray, longs: np.ndarray, shrink: float
+) -> np.ndarray:
+    """
+    Creates one segment per edge of a route, shrunk towards its midpoint
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        1D int64, index into lats and longs for each order in route order
+    lats : np.ndarray
+        Projected latitudes for orders
+    longs : np.ndarray
+        Projected longitudes for orders
+    shrink : float
+        Fraction of each edge's length removed from both ends
+
+    Returns
+    -------
+    segments : np.ndarray
+        Shape (edges, 2, 2), start and end (longitude, latitude) per edge
+    """
+    return __build_segments(positions, lats, longs, shrink)
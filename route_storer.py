@@ -1,135 +1,222 @@
 """Saves routes to data/routes folder"""
 
 import json
+import math
 import os
-import matplotlib.pyplot as plt
 import numpy as np
 from pydantic_models import RouteInput
-
-
-def create_graph(
-    locations_file: str, route: list[int], folder_name: str, file_name: str
+from route_segments import build_segments
+import matplotlib
+
+matplotlib.use("Agg")  # Non-interactive, safe to use in worker processes
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.collections import LineCollection  # noqa: E402
+
+EARTH_RADIUS_KM = 6371.0
+CENTRE_POINT_DEG = -31.952258602714696  # Approximate centre of Perth
+CENTRE_POINT_RAD = math.radians(CENTRE_POINT_DEG)
+COS_CENTRE = math.cos(CENTRE_POINT_RAD)
+
+
+def render_routes(
+    lats: np.array,
+    longs: np.array,
+    order_positions: dict[int, int],
+    routes: list[list[int]],
+    file_names: list[str],
+    folder_name: str,
 ) -> None:
     """
-    Creates a graph and saves to a folder
+    Creates a graph per route and saves each to a folder.
+    The figure and scatter layer are built once and reused, only the route
+    lines are redrawn between saves
 
     Parameters
     ----------
-    locations_path : str
-        The name of the locations file at src/data
-        The file should be in the format of RouteInput
-    route : list[int]
-        Route of index ids
+    lats : np.array
+        Projected latitudes for orders, from reformat_locations
+    longs : np.array
+        Projected longitudes for orders, from reformat_locations
+    order_positions : dict[int, int]
+        Index into lats and longs keyed by order_id, from reformat_locations
+    routes : list[list[int]]
+        Routes of index ids, one graph is saved per route
+    file_names : list[str]
+        Name of the file to be saved, aligned with routes
     folder_name : str
         Name of the folder to be saved to
-    file_name : str
-        Name of the file to be saved
     """
-    locations_path = os.path.join("data", locations_file)
-    route = [route]
-
-    lats, longs, orders = __reformat_locations(locations_path)
-
-    fig = plt.figure(figsize=(10, 6))
-    plt.scatter(longs, lats, color="blue", marker="o")
-    __add_lines(route, orders)
-    plt.title("Equirectangular Projection Scatter Plot")
-    plt.xlabel("Longitude (km)")
-    plt.ylabel("Latitude (km)")
-    plt.grid(True)
-    plt.savefig(
-        os.path.join("data", folder_name, file_name + ".png"),
-        dpi=300,
-        bbox_inches="tight",
-    )
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.scatter(longs, lats, color="blue", marker="o")
+    ax.set_title("Equirectangular Projection Scatter Plot")
+    ax.set_xlabel("Longitude (km)")
+    ax.set_ylabel("Latitude (km)")
+    ax.grid(True)
+    # Lay out once, so savefig can skip the tight bbox render per route
+    fig.tight_layout()
+
+    for route, file_name in zip(routes, file_names):
+        artists = __add_lines(ax, [route], order_positions, lats, longs)
+        fig.savefig(
+            route_path(folder_name, file_name),
+            dpi=120,
+            # Fastest zlib level, encode time dominates for many routes
+            pil_kwargs={"compress_level": 1},
+        )
+        for artist in artists:
+            artist.remove()
+
     plt.close(fig)
 
 
-def __reformat_locations(
-    locations_path: str,
-) -> tuple[np.array, np.array, dict[int, dict[str, float]]]:
+def route_path(folder_name: str, file_name: str) -> str:
+    """
+    Path that render_routes saves a route graph to
+
+    Parameters
+    ----------
+    folder_name : str
+        Name of the folder the graph is saved to
+    file_name : str
+        Name of the file, without extension
+
+    Returns
+    -------
+    path : str
+        Path to the graph under data
     """
-    Extracts the latitudes, longitudes and orders from JSON Object
+    return os.path.join("data", folder_name, file_name + ".png")
+
+
+def load_locations(locations_file: str) -> RouteInput:
+    """
+    Reads and validates the locations file once, at program start
 
     Parameters
     ----------
-    locations_path : str
+    locations_file : str
         The name of the locations file at src/data
         The file should be in the format of RouteInput
 
     Returns
     -------
-    lats : np.array
-        List of latitudes for orders
-    longs : np.array
-        List of latitudes for orders
-    orders : dict[int, dict[str,float]]
-        Key represents order_id
-        Value (inner dictionary) is in the format of:
-            lat: float
-            lon: float
-        Example: {16: {'lat': -31.899364, 'lon': 115.801288}
+    locations : RouteInput
+        Validated payload of orders
     """
+    locations_path = os.path.join("data", locations_file)
     with open(locations_path, "r", encoding="utf-8") as file:
         locations = json.load(file)
 
-    locations = RouteInput(**locations)
-    lats = [location.lat for location in locations.orders]
-    longs = [location.lon for location in locations.orders]
+    return RouteInput(**locations)
+
+
+def reformat_locations(
+    locations: RouteInput,
+) -> tuple[np.array, np.array, dict[int, int]]:
+    """
+    Extracts the projected latitudes, longitudes and order positions from
+    validated orders. Share the result across render_routes calls.
+
+    Parameters
+    ----------
+    locations : RouteInput
+        Validated payload of orders, from load_locations
+
+    Returns
+    -------
+    lats : np.array
+        Projected latitudes for orders
+    longs : np.array
+        Projected longitudes for orders
+    order_positions : dict[int, int]
+        Key represents order_id
+        Value is the index of that order in lats and longs
+        Example: {16: 0, 3: 1}
+    """
+    count = len(locations.orders)
+    lats = np.fromiter(
+        (location.lat for location in locations.orders), float, count
+    )
+    longs = np.fromiter(
+        (location.lon for location in locations.orders), float, count
+    )
     lats, longs = __equi_rect_project(lats, longs)
-    orders = {
-        order.order_id: {"lat": order.lat, "lon": order.lon}
-        for order in locations.orders
+    order_positions = {
+        order.order_id: position
+        for position, order in enumerate(locations.orders)
     }
 
-    return lats, longs, orders
+    return lats, longs, order_positions
 
 
 def __add_lines(
-    routes: list[list[int]], orders_dict: dict[int, dict[str, float]]
-) -> None:
+    ax: plt.Axes,
+    routes: list[list[int]],
+    order_positions: dict[int, int],
+    lats: np.array,
+    longs: np.array,
+) -> list:
     """
-    Adds arrows for each edge in routes list
+    Adds arrows for each edge in routes list.
+    All edges are drawn as one LineCollection, with one quiver for arrowheads
 
     Parameters
     ----------
+    ax : plt.Axes
+        Axes to draw the arrows on
     routes : list[list[int]]
         Contains a list of lists of routes in sorted order
         Outer lists contains the list of routes
         Inner list contains the orders in sorted order
-    orders_dict : dict[int, dict[str,float]]
-        Key represents order_id
-        Value (inner dictionary) is in the format of:
-            lat: float
-            lon: float
-        Example: {16: {'lat': -31.899364, 'lon': 115.801288}
+    order_positions : dict[int, int]
+        Index into lats and longs keyed by order_id
+    lats : np.array
+        Projected latitudes for orders
+    longs : np.array
+        Projected longitudes for orders
+
+    Returns
+    -------
+    artists : list
+        Artists added to ax, remove these to clear the route
     """
-    start_longs = []
-    start_lat = []
-    end_longs = []
-    end_lats = []
+    # Coordinates are already projected, so each edge is just an index pair
+    segments = []
     for route in routes:
-        for i in range(len(route) - 1):
-            start_id = route[i]
-            end_id = route[i + 1]
-
-            start_longs.append(orders_dict[start_id]["lon"])
-            start_lat.append(orders_dict[start_id]["lat"])
-            end_longs.append(orders_dict[end_id]["lon"])
-            end_lats.append(orders_dict[end_id]["lat"])
-
-    start_lats, start_longs = __equi_rect_project(start_lat, start_longs)
-    end_lats, end_longs = __equi_rect_project(end_lats, end_longs)
-
-    for i in range(len(start_lats)):
-        plt.annotate(
-            "",
-            xy=(end_longs[i], end_lats[i]),
-            xytext=(start_longs[i], start_lats[i]),
-            arrowprops=dict(
-                facecolor="red", shrink=0.15, headlength=7, headwidth=7, width=3
-            ),
+        positions = np.fromiter(
+            (order_positions[order_id] for order_id in route),
+            np.int64,
+            len(route),
         )
+        # Shrink 15% from both ends so arrows stop short of the markers
+        segments.append(build_segments(positions, lats, longs, 0.15))
+
+    segments = np.concatenate(segments)
+
+    if len(segments) == 0:
+        return []
+
+    directions = segments[:, 1] - segments[:, 0]
+
+    lines = ax.add_collection(
+        LineCollection(segments, colors="red", linewidths=3)
+    )
+    heads = ax.quiver(
+        segments[:, 0, 0],
+        segments[:, 0, 1],
+        directions[:, 0],
+        directions[:, 1],
+        angles="xy",
+        scale_units="xy",
+        scale=1,
+        color="red",
+        width=0.002,
+        headwidth=6,
+        headlength=6,
+        headaxislength=5.5,
+    )
+
+    return [lines, heads]
 
 
 def __equi_rect_project(
@@ -141,10 +228,10 @@ def __equi_rect_project(
 
     Parameters
     ----------
-    latitudes : list of floats
-        List of latitudes for orders
-    longitudes : list of floats
+    latitudes : list or ndarray of floats
         List of latitudes for orders
+    longitudes : list or ndarray of floats
+        List of longitudes for orders
 
     Returns
     -------
@@ -153,21 +240,8 @@ def __equi_rect_project(
     longitudes : ndarray
         1D, contains array of projected longitudes
     """
-    latitudes = np.array(latitudes)
-    longitudes = np.array(longitudes)
-
-    r = 6371  # Radius of Earth
-    centre_point_deg = (
-        -31.952258602714696
-    )  # Hardcoded to approximate centre of Perth
-
-    # Convert to radians
-    center_latitude_radians = np.radians(centre_point_deg)
-    longitudes_radians = np.radians(longitudes)
-    latitudes_radians = np.radians(latitudes)
-
-    # Apply equirectangular projection
-    longitudes = r * longitudes_radians * np.cos(center_latitude_radians)
-    latitudes = r * latitudes_radians
+    # np.radians accepts lists and arrays alike, so no copy is made up front
+    latitudes = EARTH_RADIUS_KM * np.radians(latitudes)
+    longitudes = EARTH_RADIUS_KM * np.radians(longitudes) * COS_CENTRE
 
     return latitudes, longitudes